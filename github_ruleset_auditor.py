@@ -18,7 +18,7 @@ The ruleset:
 - Protects against leaked CI tokens
 
 Requirements:
-    pip install requests
+    pip install requests requests-cache orjson
 
 Usage:
     export GITHUB_TOKEN="your_personal_access_token"
@@ -38,14 +38,27 @@ Usage:
 
 import os
 import sys
-import json
+import time
+import hashlib
+import logging
 import csv
 import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Optional
+from functools import partial
+from itertools import chain, islice
+from typing import Iterator, Optional
+from urllib.parse import parse_qs, urlparse
 from importlib.metadata import version, PackageNotFoundError
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from requests_cache import CachedSession
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
 
 # Version is read from pyproject.toml (single source of truth)
 try:
@@ -55,17 +68,116 @@ except PackageNotFoundError:
     __version__ = "dev"
 
 
+def should_apply(row: dict) -> bool:
+    """True if a manifest CSV row is marked YES (case-insensitive) for protection."""
+    return row.get("apply_protection", "").strip().upper() == "YES"
+
+
+def should_skip(repo: dict) -> bool:
+    """True for repos that are never audited: archived or forked."""
+    return bool(repo.get("archived") or repo.get("fork"))
+
+
 class GitHubRulesetAuditor:
-    def __init__(self, token: str):
+    def __init__(self, token: str, max_workers: int = 10, cache_ttl: Optional[int] = None):
         self.token = token
+        self.max_workers = max_workers
         self.base_url = "https://api.github.com"
         self.headers = {
             "Authorization": f"token {token}",
             "Accept": "application/vnd.github.v3+json",
         }
+
+        # One pooled session for every call, so connections (and TLS handshakes)
+        # to api.github.com are reused. Transient 5xx responses are retried.
+        if cache_ttl is None:
+            self.session = requests.Session()
+        else:
+            # GETs are cached on disk and revalidated with GitHub's ETag and
+            # Cache-Control headers; 304s don't count against the rate limit.
+            # The token itself is never cached, but the cache file is keyed on
+            # its hash so different tokens never share responses.
+            token_hash = hashlib.sha256(token.encode()).hexdigest()[:16]
+            self.session = CachedSession(
+                f"github_ruleset_auditor_{token_hash}",
+                backend="sqlite",
+                use_cache_dir=True,
+                expire_after=cache_ttl,
+                cache_control=True,
+                allowable_methods=("GET",),
+            )
+        self.session.headers.update(self.headers)
+        # Page prefetching and ruleset checks each use up to max_workers threads
+        pool_size = max(20, 2 * max_workers)
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            # Return the last 5xx instead of raising once retries run out, so it is
+            # reported per repo. Rate limits (Retry-After) are handled only by _send.
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504],
+                              raise_on_status=False, respect_retry_after_header=False),
+        )
+        self.session.mount("https://", adapter)
+
         self.manifest = []
         self.authenticated_user = None
         self.authenticated_user_id = None
+        # The audited user or org, and whether it is an org (set by process_repos)
+        self.owner = None
+        self.is_org = False
+
+        # Bypass actors
+        # For org repos: use User type with authenticated user ID (filled in per request)
+        # For personal repos: use RepositoryRole type (5 = Maintain role, includes owner)
+        # RepositoryRole IDs: 1=Read, 2=Triage, 4=Write, 5=Maintain
+        self._personal_ruleset_body = orjson.dumps(self.default_ruleset_config(
+            {"actor_id": 5, "actor_type": "RepositoryRole", "bypass_mode": "always"}
+        ))
+        self._org_ruleset_template = orjson.dumps(self.default_ruleset_config(
+            {"actor_id": "__USER_ID__", "actor_type": "User", "bypass_mode": "always"}
+        ))
+
+    def _get(self, url: str, revalidate: bool = False, **kwargs) -> requests.Response:
+        """GET a URL on the shared session, waiting out rate limits.
+
+        With ``revalidate``, a cached response is always confirmed with GitHub via
+        If-None-Match; a 304 reuses the cached body and costs no rate limit.
+        """
+        if revalidate and isinstance(self.session, CachedSession):
+            kwargs["refresh"] = True
+        return self._send(self.session.get, url, **kwargs)
+
+    def _post(self, url: str, **kwargs) -> requests.Response:
+        """POST to a URL on the shared session, waiting out rate limits."""
+        return self._send(self.session.post, url, **kwargs)
+
+    def _send(self, send, url: str, max_waits: int = 3, **kwargs) -> requests.Response:
+        """Send a request, sleeping and retrying while GitHub reports a rate limit."""
+        for attempt in range(max_waits + 1):
+            response = send(url, **kwargs)
+            delay = self._rate_limit_delay(response)
+            if delay is None or attempt == max_waits:
+                return response
+            logger.warning(f"    Rate limited by GitHub, waiting {delay:.0f}s before retrying...")
+            time.sleep(delay)
+
+    @staticmethod
+    def _rate_limit_delay(response: requests.Response) -> Optional[float]:
+        """Seconds to wait before retrying a rate-limited response, or None if not rate limited."""
+        if response.status_code not in (403, 429):
+            return None
+
+        # Secondary rate limits send Retry-After
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            return float(retry_after)
+
+        # Primary rate limit: wait until the window resets
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            reset_at = int(response.headers.get("X-RateLimit-Reset", "0"))
+            return max(0.0, reset_at - time.time()) + 1
+
+        return None
 
     def get_authenticated_user(self) -> dict:
         """Get the authenticated user's info (for bypass actor)."""
@@ -73,92 +185,118 @@ class GitHubRulesetAuditor:
             return self.authenticated_user
 
         url = f"{self.base_url}/user"
-        response = requests.get(url, headers=self.headers)
+        response = self._get(url)
 
         if response.status_code != 200:
-            print(f"Error getting authenticated user: {response.status_code} - {response.text}")
+            logger.error(f"Error getting authenticated user: {response.status_code} - {response.text}")
             sys.exit(1)
 
         self.authenticated_user = response.json()
         self.authenticated_user_id = self.authenticated_user["id"]
-        print(f"Authenticated as: {self.authenticated_user['login']} (ID: {self.authenticated_user_id})")
+        logger.info(f"Authenticated as: {self.authenticated_user['login']} (ID: {self.authenticated_user_id})")
         return self.authenticated_user
 
     def get_repos(self, username: Optional[str] = None, org: Optional[str] = None,
                   visibility: str = "public") -> list:
-        """Fetch repositories for a user or organization.
+        """Fetch all repositories for a user or organization as a list.
+
+        See iter_repos() for the arguments.
+        """
+        return list(self.iter_repos(username=username, org=org, visibility=visibility))
+
+    def iter_repos(self, username: Optional[str] = None, org: Optional[str] = None,
+                   visibility: str = "public") -> Iterator[dict]:
+        """Yield repositories for a user or organization, page by page as they arrive.
 
         Args:
             username: GitHub username (for personal repos)
             org: GitHub organization name
             visibility: Filter by visibility - 'public', 'private', or 'all'
         """
-        repos = []
-        page = 1
+        total = 0
         per_page = 100
 
-        # Map visibility to API type parameter
-        # For orgs: public, private, all
-        # For users: public, private, all (but API uses 'owner' for authenticated user's repos)
-        if org:
-            url = f"{self.base_url}/orgs/{org}/repos"
-            api_type = visibility if visibility != "all" else "all"
-        else:
-            url = f"{self.base_url}/users/{username}/repos"
-            api_type = visibility if visibility != "all" else "all"
-
-        params = {"type": api_type, "per_page": per_page}
+        # Visibility is passed through as the API type parameter; repos are also
+        # filtered by visibility below, since the users endpoint doesn't honor it
+        url = f"{self.base_url}/{'orgs/' + org if org else 'users/' + username}/repos"
+        params = {"type": visibility, "per_page": per_page}
 
         visibility_label = visibility if visibility != "all" else "all (public + private)"
-        print(f"\nFetching {visibility_label} repositories for {'org: ' + org if org else 'user: ' + username}...")
+        logger.info(f"\nFetching {visibility_label} repositories for {'org: ' + org if org else 'user: ' + username}...")
 
-        while True:
-            params["page"] = page
-            response = requests.get(url, headers=self.headers, params=params)
+        def fetch_page(page: int) -> requests.Response:
+            response = self._get(url, params={**params, "page": page})
 
             if response.status_code != 200:
-                print(f"Error fetching repos: {response.status_code} - {response.text}")
+                logger.error(f"Error fetching repos: {response.status_code} - {response.text}")
                 sys.exit(1)
 
-            page_repos = response.json()
-            if not page_repos:
-                break
-
-            # Filter based on visibility and exclude archived/forked repos
-            filtered_repos = []
-            for r in page_repos:
-                is_private = r.get("private", False)
-                is_archived = r.get("archived", False)
-                is_fork = r.get("fork", False)
-
-                # Skip archived and forked repos always
-                if is_archived or is_fork:
-                    continue
-
-                # Apply visibility filter
-                if visibility == "public" and is_private:
-                    continue
-                if visibility == "private" and not is_private:
-                    continue
-                # visibility == "all" includes both
-
-                filtered_repos.append(r)
-
-            repos.extend(filtered_repos)
-
-            skipped = len(page_repos) - len(filtered_repos)
-            forked = sum(1 for r in page_repos if r.get("fork", False))
-            archived = sum(1 for r in page_repos if r.get("archived", False))
-            print(f"  Page {page}: {len(filtered_repos)} repos (skipped {archived} archived, {forked} forked)")
-            page += 1
-
-        print(f"Total eligible repositories: {len(repos)}")
-        return repos
+            return response
+
+        # Page 1's Link header names the last page, so the rest can be prefetched
+        # concurrently while earlier pages are being consumed
+        first_response = fetch_page(1)
+        last_url = first_response.links.get("last", {}).get("url")
+        last_page = int(parse_qs(urlparse(last_url).query)["page"][0]) if last_url else 1
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Keep at most max_workers pages in flight, submitting the next as each
+            # is consumed, so raw page responses don't pile up ahead of the caller
+            later_pages = iter(range(2, last_page + 1))
+            in_flight = deque(executor.submit(fetch_page, p) for p in islice(later_pages, self.max_workers))
+
+            def later_responses():
+                while in_flight:
+                    response = in_flight.popleft().result()
+                    next_page = next(later_pages, None)
+                    if next_page is not None:
+                        in_flight.append(executor.submit(fetch_page, next_page))
+                    yield response
+
+            for page, response in enumerate(chain([first_response], later_responses()), 1):
+                page_repos = response.json()
+                if not page_repos:
+                    break
+
+                # Filter based on visibility and exclude archived/forked repos,
+                # counting what is skipped as we go
+                filtered_repos = []
+                archived = forked = 0
+                for r in page_repos:
+                    is_private = r.get("private", False)
+
+                    # Skip archived and forked repos always
+                    if should_skip(r):
+                        archived += bool(r.get("archived"))
+                        forked += bool(r.get("fork"))
+                        continue
+
+                    # Apply visibility filter
+                    if visibility == "public" and is_private:
+                        continue
+                    if visibility == "private" and not is_private:
+                        continue
+                    # visibility == "all" includes both
+
+                    # Keep only the fields used downstream; the API returns ~80 per repo
+                    filtered_repos.append({
+                        "name": r["name"],
+                        "full_name": r["full_name"],
+                        "default_branch": r.get("default_branch", "main"),
+                        "html_url": r["html_url"],
+                        "private": is_private,
+                    })
+
+                total += len(filtered_repos)
+                logger.info(f"  Page {page}: {len(filtered_repos)} repos (skipped {archived} archived, {forked} forked)")
+                yield from filtered_repos
+
+        logger.info(f"Total eligible repositories: {total}")
 
     def get_repo_rulesets(self, owner: str, repo: str) -> list:
         """Get all rulesets for a repository."""
         url = f"{self.base_url}/repos/{owner}/{repo}/rulesets"
-        response = requests.get(url, headers=self.headers)
+        response = self._get(url, revalidate=True)
 
         if response.status_code == 200:
             return response.json()
@@ -170,7 +308,7 @@ class GitHubRulesetAuditor:
     def get_ruleset_details(self, owner: str, repo: str, ruleset_id: int) -> dict:
         """Get full details of a specific ruleset (including conditions)."""
         url = f"{self.base_url}/repos/{owner}/{repo}/rulesets/{ruleset_id}"
-        response = requests.get(url, headers=self.headers)
+        response = self._get(url, revalidate=True)
 
         if response.status_code == 200:
             return response.json()
@@ -184,11 +322,15 @@ class GitHubRulesetAuditor:
         if isinstance(rulesets, dict) and "error" in rulesets:
             return {"has_ruleset": None, "error": rulesets["error"]}
 
+        default_branch_refs = self._default_branch_refs(default_branch)
+
         # Look for a ruleset targeting the default branch
-        # Note: The list endpoint doesn't include conditions, so we need to fetch details
-        for ruleset in rulesets:
+        # Note: The list endpoint doesn't include conditions, so we need to fetch details.
+        # It does include the target, so tag and push rulesets are skipped without a fetch,
+        # and rulesets whose names suggest branch protection are fetched first.
+        for ruleset in sorted(rulesets, key=self._ruleset_fetch_priority):
             ruleset_id = ruleset.get("id")
-            if not ruleset_id:
+            if not ruleset_id or ruleset.get("target", "branch") != "branch":
                 continue
 
             # Fetch full details to get conditions
@@ -196,32 +338,146 @@ class GitHubRulesetAuditor:
             if isinstance(details, dict) and "error" in details:
                 continue
 
-            conditions = details.get("conditions", {})
-            ref_name = conditions.get("ref_name", {})
-            includes = ref_name.get("include", [])
-
-            # Check if it targets default branch or the specific branch name
-            if "~DEFAULT_BRANCH" in includes or f"refs/heads/{default_branch}" in includes or default_branch in includes:
-                return {
-                    "has_ruleset": True,
-                    "ruleset_id": details.get("id"),
-                    "ruleset_name": details.get("name"),
-                    "enforcement": details.get("enforcement"),
-                    "rules": details.get("rules", []),
-                    "bypass_actors": details.get("bypass_actors", []),
-                }
+            status = self._match_ruleset(details, default_branch_refs)
+            if status:
+                return status
 
         return {"has_ruleset": False}
 
-    def create_default_ruleset(self, owner: str, repo: str, is_org: bool = False) -> dict:
-        """Create a ruleset for the default branch.
+    @staticmethod
+    def _ruleset_fetch_priority(ruleset: dict) -> int:
+        """Sort key putting rulesets likely to protect the default branch first."""
+        name = (ruleset.get("name") or "").lower()
+        return 0 if any(hint in name for hint in ("default", "main", "branch", "protect")) else 1
+
+    @staticmethod
+    def _default_branch_refs(default_branch: str) -> set:
+        """Ref patterns that mean "this ruleset covers the default branch"."""
+        return {"~DEFAULT_BRANCH", f"refs/heads/{default_branch}", default_branch}
+
+    @staticmethod
+    def _match_ruleset(details: dict, default_branch_refs: set) -> Optional[dict]:
+        """Return the ruleset status if the ruleset's conditions cover the default branch."""
+        conditions = details.get("conditions") or {}
+        ref_name = conditions.get("ref_name") or {}
+        includes = ref_name.get("include", [])
+
+        # Check if it targets default branch or the specific branch name
+        if default_branch_refs.isdisjoint(includes):
+            return None
+
+        return {
+            "has_ruleset": True,
+            "ruleset_id": details.get("id"),
+            "ruleset_name": details.get("name"),
+            "enforcement": details.get("enforcement"),
+            "rules": details.get("rules", []),
+            "bypass_actors": details.get("bypass_actors", []),
+        }
 
-        For org repos, adds the authenticated user as a bypass actor.
-        For personal repos, bypass_actors is omitted (owner has full access by default).
+    def query_rulesets_bulk(self, repos: list) -> dict:
+        """Fetch rulesets for many repos in a single GraphQL request.
+
+        Args:
+            repos: (owner, name) tuples, at most ~50 per call
+
+        Returns:
+            Dict mapping (owner, name) to that repo's rulesets, shaped like the REST
+            ruleset details. Repos that couldn't be resolved completely are left out
+            so the caller can fall back to REST for them.
         """
-        url = f"{self.base_url}/repos/{owner}/{repo}/rulesets"
+        if not repos:
+            return {}
+
+        # Variables keep owner/repo names out of the query text
+        variables = {}
+        declarations = []
+        fields = []
+        for i, (owner, name) in enumerate(repos):
+            variables[f"o{i}"] = owner
+            variables[f"n{i}"] = name
+            declarations.append(f"$o{i}: String!, $n{i}: String!")
+            fields.append(f"r{i}: repository(owner: $o{i}, name: $n{i}) {{ ...RepoRulesets }}")
+
+        query = (
+            f"query({', '.join(declarations)}) {{ {' '.join(fields)} }}\n"
+            "fragment RepoRulesets on Repository {\n"
+            "  rulesets(first: 20) {\n"
+            "    pageInfo { hasNextPage }\n"
+            "    nodes {\n"
+            "      databaseId name target enforcement\n"
+            "      conditions { refName { include exclude } }\n"
+            "      rules(first: 30) { nodes { type } }\n"
+            "      bypassActors(first: 30) { nodes { bypassMode } }\n"
+            "    }\n"
+            "  }\n"
+            "}"
+        )
+
+        try:
+            response = self._post(f"{self.base_url}/graphql", json={"query": query, "variables": variables})
+            if response.status_code != 200:
+                logger.warning(f"    ⚠ GraphQL ruleset query failed ({response.status_code}), falling back to REST")
+                return {}
+            data = response.json().get("data") or {}
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"    ⚠ GraphQL ruleset query failed ({e}), falling back to REST")
+            return {}
+
+        results = {}
+        for i, repo in enumerate(repos):
+            rulesets = (data.get(f"r{i}") or {}).get("rulesets")
+            # Missing repos (errors) and truncated ruleset lists fall back to REST
+            if not rulesets or (rulesets.get("pageInfo") or {}).get("hasNextPage", True):
+                continue
+            converted = [self._ruleset_from_graphql(node) for node in rulesets.get("nodes") or []]
+            # Fields GitHub withheld (null, with an entry in "errors") also fall back to REST
+            if None in converted:
+                continue
+            results[repo] = converted
+        return results
+
+    @staticmethod
+    def _ruleset_from_graphql(node: Optional[dict]) -> Optional[dict]:
+        """Convert a GraphQL ruleset node to the REST ruleset details shape.
+
+        Returns None if GitHub left out any field needed for the conversion.
+        """
+        if not node or node.get("databaseId") is None or node.get("rules") is None \
+                or node.get("bypassActors") is None:
+            return None
+        ref_name = (node.get("conditions") or {}).get("refName") or {}
+        return {
+            "id": node["databaseId"],
+            "name": node["name"],
+            "target": (node.get("target") or "").lower(),
+            "enforcement": (node.get("enforcement") or "").lower(),
+            "conditions": {
+                "ref_name": {
+                    "include": ref_name.get("include", []),
+                    "exclude": ref_name.get("exclude", []),
+                }
+            },
+            "rules": [{"type": (r.get("type") or "").lower()} for r in node["rules"].get("nodes") or []],
+            "bypass_actors": [{"bypass_mode": (a.get("bypassMode") or "").lower()}
+                              for a in node["bypassActors"].get("nodes") or []],
+        }
 
-        ruleset_config = {
+    def find_default_branch_ruleset(self, rulesets: list, default_branch: str) -> dict:
+        """Check already-fetched ruleset details for one protecting the default branch."""
+        default_branch_refs = self._default_branch_refs(default_branch)
+        for ruleset in rulesets:
+            if ruleset.get("target", "branch") != "branch":
+                continue
+            status = self._match_ruleset(ruleset, default_branch_refs)
+            if status:
+                return status
+        return {"has_ruleset": False}
+
+    @staticmethod
+    def default_ruleset_config(bypass_actor: dict) -> dict:
+        """Build the ruleset applied to unprotected repos, with the given bypass actor."""
+        return {
             "name": "default-branch-protection",
             "target": "branch",
             "enforcement": "active",
@@ -249,102 +505,137 @@ class GitHubRulesetAuditor:
                     }
                 }
             ],
+            "bypass_actors": [bypass_actor],
         }
 
-        # Add bypass actors
-        # For org repos: use User type with authenticated user ID
-        # For personal repos: use RepositoryRole type (5 = Maintain role, includes owner)
+    def create_default_ruleset(self, owner: str, repo: str, is_org: bool = False) -> dict:
+        """Create a ruleset for the default branch.
+
+        For org repos, adds the authenticated user as a bypass actor.
+        For personal repos, the Maintain repository role (which includes the owner) bypasses.
+        """
+        url = f"{self.base_url}/repos/{owner}/{repo}/rulesets"
+
+        # The request bodies are serialized once in __init__; only the org
+        # body varies, by the authenticated user's ID
         if is_org:
-            ruleset_config["bypass_actors"] = [
-                {
-                    "actor_id": self.authenticated_user_id,
-                    "actor_type": "User",
-                    "bypass_mode": "always"
-                }
-            ]
+            # Only org rulesets need the user ID, so it's fetched on first use
+            if self.authenticated_user_id is None:
+                self.get_authenticated_user()
+            body = self._org_ruleset_template.replace(b'"__USER_ID__"', str(self.authenticated_user_id).encode())
         else:
-            # RepositoryRole IDs: 1=Read, 2=Triage, 4=Write, 5=Maintain
-            # Owner has maintain+ permissions, so this gives them bypass
-            ruleset_config["bypass_actors"] = [
-                {
-                    "actor_id": 5,
-                    "actor_type": "RepositoryRole",
-                    "bypass_mode": "always"
-                }
-            ]
+            body = self._personal_ruleset_body
 
-        response = requests.post(url, headers=self.headers, json=ruleset_config)
+        response = self._post(url, data=body, headers={"Content-Type": "application/json"})
 
         if response.status_code in [200, 201]:
+            # Drop the cached rulesets list so a re-audit sees the new ruleset
+            if isinstance(self.session, CachedSession):
+                self.session.cache.delete(urls=[url])
             return {"success": True, "ruleset": response.json()}
         else:
             return {"success": False, "error": f"{response.status_code}: {response.text}"}
 
     def process_repos(self, username: Optional[str] = None, org: Optional[str] = None,
                       apply_ruleset: bool = False, dry_run: bool = False,
-                      visibility: str = "public") -> list:
+                      visibility: str = "public", chunk_size: int = 50) -> list:
         """Process all repos, check ruleset status, and optionally apply rulesets."""
-        # Get authenticated user first (needed for bypass actor)
-        self.get_authenticated_user()
-
         owner = org if org else username
-        repos = self.get_repos(username=username, org=org, visibility=visibility)
-
-        print(f"\nChecking ruleset status for {len(repos)} repositories...")
-        print("-" * 70)
+        self.owner, self.is_org = owner, bool(org)
 
-        for i, repo in enumerate(repos, 1):
-            repo_name = repo["name"]
+        def check(bulk_rulesets, repo):
             default_branch = repo.get("default_branch", "main")
-            full_name = repo["full_name"]
-
-            print(f"[{i}/{len(repos)}] {full_name} (branch: {default_branch})")
-
-            ruleset_status = self.check_default_branch_ruleset(owner, repo_name, default_branch)
-
-            manifest_entry = {
-                "repo_name": repo_name,
-                "full_name": full_name,
-                "default_branch": default_branch,
-                "html_url": repo["html_url"],
-                "has_ruleset": ruleset_status.get("has_ruleset"),
-                "ruleset_name": ruleset_status.get("ruleset_name"),
-                "ruleset_id": ruleset_status.get("ruleset_id"),
-                "enforcement": ruleset_status.get("enforcement"),
-                "bypass_actors_count": len(ruleset_status.get("bypass_actors", [])),
-                "error": ruleset_status.get("error"),
-                "action_taken": None,
-                "checked_at": datetime.now(timezone.utc).isoformat(),
-            }
-
-            # Apply ruleset if requested and none exists
-            if apply_ruleset and ruleset_status.get("has_ruleset") is False:
-                if dry_run:
-                    print(f"    [DRY RUN] Would create ruleset for {full_name}")
-                    manifest_entry["action_taken"] = "dry_run_would_create"
-                else:
-                    print(f"    Creating ruleset...")
-                    result = self.create_default_ruleset(owner, repo_name, is_org=bool(org))
-                    if result.get("success"):
-                        print(f"    ✓ Ruleset created successfully")
-                        manifest_entry["action_taken"] = "ruleset_created"
-                        manifest_entry["has_ruleset"] = True
-                        manifest_entry["ruleset_name"] = "default-branch-protection"
+            rulesets = bulk_rulesets.get((owner, repo["name"]))
+            if rulesets is None:
+                # Not resolved by GraphQL, fall back to REST
+                return self.check_default_branch_ruleset(owner, repo["name"], default_branch)
+            return self.find_default_branch_ruleset(rulesets, default_branch)
+
+        # Ruleset checks are independent network calls, so run them concurrently.
+        # Repos are consumed from the generator a chunk at a time, and each chunk's
+        # GraphQL lookup is queued one chunk ahead, so checks, output and page
+        # fetches overlap and the full repo list is never held in memory. Results
+        # are consumed in repo order, keeping output and ruleset creation sequential.
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            repos = iter(self.iter_repos(username=username, org=org, visibility=visibility))
+            chunks = iter(lambda: list(islice(repos, chunk_size)), [])
+            lookups = ((chunk, executor.submit(self.query_rulesets_bulk, [(owner, r["name"]) for r in chunk]))
+                       for chunk in chunks)
+
+            def statuses(ahead):
+                while ahead:
+                    (chunk, bulk_future), ahead = ahead, next(lookups, None)
+                    yield from zip(chunk, executor.map(partial(check, bulk_future.result()), chunk))
+
+            first = next(lookups, None)
+            logger.info("\nChecking ruleset status...")
+            logger.info("-" * 70)
+
+            for i, (repo, ruleset_status) in enumerate(statuses(first), 1):
+                repo_name = repo["name"]
+                default_branch = repo.get("default_branch", "main")
+                full_name = repo["full_name"]
+
+                logger.info(f"[{i}] {full_name} (branch: {default_branch})")
+
+                manifest_entry = {
+                    "repo_name": repo_name,
+                    "full_name": full_name,
+                    "default_branch": default_branch,
+                    "html_url": repo["html_url"],
+                    "has_ruleset": ruleset_status.get("has_ruleset"),
+                    "ruleset_name": ruleset_status.get("ruleset_name"),
+                    "ruleset_id": ruleset_status.get("ruleset_id"),
+                    "enforcement": ruleset_status.get("enforcement"),
+                    "bypass_actors_count": len(ruleset_status.get("bypass_actors", [])),
+                    "error": ruleset_status.get("error"),
+                    "action_taken": None,
+                    "checked_at": datetime.now(timezone.utc).isoformat(),
+                }
+
+                # Apply ruleset if requested and none exists
+                if apply_ruleset and ruleset_status.get("has_ruleset") is False:
+                    if dry_run:
+                        logger.info(f"    [DRY RUN] Would create ruleset for {full_name}")
+                        manifest_entry["action_taken"] = "dry_run_would_create"
                     else:
-                        print(f"    ✗ Failed: {result.get('error')}")
-                        manifest_entry["action_taken"] = "creation_failed"
-                        manifest_entry["error"] = result.get("error")
-            elif ruleset_status.get("has_ruleset"):
-                print(f"    ✓ Has ruleset: {ruleset_status.get('ruleset_name')} ({ruleset_status.get('enforcement')})")
-            elif ruleset_status.get("error"):
-                print(f"    ⚠ Error: {ruleset_status.get('error')}")
-            else:
-                print(f"    ✗ No ruleset")
+                        logger.info(f"    Creating ruleset...")
+                        result = self.create_default_ruleset(owner, repo_name, is_org=bool(org))
+                        if result.get("success"):
+                            logger.info(f"    ✓ Ruleset created successfully")
+                            manifest_entry["action_taken"] = "ruleset_created"
+                            manifest_entry["has_ruleset"] = True
+                            manifest_entry["ruleset_name"] = "default-branch-protection"
+                        else:
+                            logger.warning(f"    ✗ Failed to create ruleset for {full_name}: {result.get('error')}")
+                            manifest_entry["action_taken"] = "creation_failed"
+                            manifest_entry["error"] = result.get("error")
+                elif ruleset_status.get("has_ruleset"):
+                    logger.info(f"    ✓ Has ruleset: {ruleset_status.get('ruleset_name')} ({ruleset_status.get('enforcement')})")
+                elif ruleset_status.get("error"):
+                    logger.warning(f"    ⚠ Error checking {full_name}: {ruleset_status.get('error')}")
+                else:
+                    logger.info(f"    ✗ No ruleset")
 
-            self.manifest.append(manifest_entry)
+                self.manifest.append(manifest_entry)
 
         return self.manifest
 
+    def _count_manifest(self) -> tuple:
+        """Count (with ruleset, without ruleset, errors, created) in one pass."""
+        has_ruleset = no_ruleset = errors = created = 0
+        for entry in self.manifest:
+            status = entry["has_ruleset"]
+            if status:
+                has_ruleset += 1
+            elif status is False:
+                no_ruleset += 1
+            elif status is None:
+                errors += 1
+            if entry["action_taken"] == "ruleset_created":
+                created += 1
+        return has_ruleset, no_ruleset, errors, created
+
     def save_manifest(self, output_dir: str = ".") -> tuple:
         """Save the manifest to JSON and CSV files."""
         timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
@@ -352,102 +643,114 @@ class GitHubRulesetAuditor:
         csv_path = os.path.join(output_dir, f"ruleset_manifest_{timestamp}.csv")
 
         # Summary stats
-        has_ruleset = sum(1 for r in self.manifest if r["has_ruleset"])
-        no_ruleset = sum(1 for r in self.manifest if r["has_ruleset"] is False)
-        errors = sum(1 for r in self.manifest if r["has_ruleset"] is None)
+        has_ruleset, no_ruleset, errors, _ = self._count_manifest()
 
         # Save JSON
-        with open(json_path, "w") as f:
-            json.dump({
+        with open(json_path, "wb") as f:
+            f.write(orjson.dumps({
                 "generated_at": datetime.now(timezone.utc).isoformat(),
-                "authenticated_user": self.authenticated_user["login"],
+                "owner": self.owner,
+                # Only known when rulesets were created; audit-only runs skip the lookup
+                "authenticated_user": self.authenticated_user["login"] if self.authenticated_user else None,
                 "authenticated_user_id": self.authenticated_user_id,
                 "total_repos": len(self.manifest),
                 "with_ruleset": has_ruleset,
                 "without_ruleset": no_ruleset,
                 "errors": errors,
                 "repositories": self.manifest,
-            }, f, indent=2)
+            }, option=orjson.OPT_INDENT_2))
 
         # Save CSV with apply_protection column for user to edit
-        with open(csv_path, "w", newline="") as f:
+        # Default apply_protection to YES if no ruleset, NO if already has one
+        rows = (
+            (
+                entry["repo_name"],
+                entry["full_name"],
+                entry["default_branch"],
+                entry["html_url"],
+                entry["has_ruleset"],
+                entry["ruleset_name"],
+                entry["enforcement"],
+                entry["action_taken"],
+                entry["error"],
+                "NO" if entry["has_ruleset"] else "YES",
+            )
+            for entry in self.manifest
+        )
+        with open(csv_path, "w", newline="", buffering=1 << 20) as f:
             writer = csv.writer(f)
             writer.writerow([
                 "repo_name", "full_name", "default_branch", "html_url",
                 "has_ruleset", "ruleset_name", "enforcement", "action_taken", "error",
                 "apply_protection"
             ])
-            for entry in self.manifest:
-                # Default to YES if no ruleset, NO if already has one
-                apply_default = "NO" if entry["has_ruleset"] else "YES"
-                writer.writerow([
-                    entry["repo_name"],
-                    entry["full_name"],
-                    entry["default_branch"],
-                    entry["html_url"],
-                    entry["has_ruleset"],
-                    entry["ruleset_name"],
-                    entry["enforcement"],
-                    entry["action_taken"],
-                    entry["error"],
-                    apply_default,
-                ])
+            writer.writerows(rows)
 
         return json_path, csv_path
 
     def apply_from_csv(self, csv_path: str, dry_run: bool = False) -> dict:
         """Apply rulesets based on a user-edited CSV file."""
-        self.get_authenticated_user()
-
         results = {"applied": 0, "skipped": 0, "failed": 0, "already_protected": 0}
 
-        print(f"\nReading decisions from: {csv_path}")
-        print("-" * 70)
+        logger.info(f"\nReading decisions from: {csv_path}")
+        logger.info("-" * 70)
 
         with open(csv_path, "r") as f:
             reader = csv.DictReader(f)
             rows = list(reader)
 
         total = len(rows)
-        to_apply = [r for r in rows if r.get("apply_protection", "").upper() == "YES"]
-        print(f"Total repos in CSV: {total}")
-        print(f"Marked for protection: {len(to_apply)}")
-        print("-" * 70)
-
-        for i, row in enumerate(rows, 1):
-            repo_name = row["repo_name"]
-            full_name = row["full_name"]
-            apply_protection = row.get("apply_protection", "").upper()
-
-            print(f"[{i}/{total}] {full_name}", end=" ")
-
-            if apply_protection != "YES":
-                print("- SKIP (not marked YES)")
-                results["skipped"] += 1
-                continue
-
-            if row.get("has_ruleset") == "True":
-                print("- SKIP (already protected)")
-                results["already_protected"] += 1
-                continue
-
-            if dry_run:
-                print("- [DRY RUN] Would apply ruleset")
-                results["applied"] += 1
-                continue
-
-            # Extract owner from full_name (e.g., "psenger/repo" -> "psenger")
-            owner = full_name.split("/")[0]
-            # Detect if this is an org repo (owner != authenticated user)
-            is_org = owner != self.authenticated_user["login"]
-            result = self.create_default_ruleset(owner, repo_name, is_org=is_org)
+        to_apply = [r for r in rows if should_apply(r)]
+        logger.info(f"Total repos in CSV: {total}")
+        logger.info(f"Marked for protection: {len(to_apply)}")
+        logger.info("-" * 70)
+
+        # Submit the ruleset POSTs up front so they run concurrently; results are
+        # collected in CSV order below so the output stays ordered.
+        with ThreadPoolExecutor(max_workers=min(8, self.max_workers)) as executor:
+            futures = {}
+            to_create = [] if dry_run else [
+                (i, row) for i, row in enumerate(rows, 1)
+                if should_apply(row) and row.get("has_ruleset") != "True"
+            ]
+            if to_create:
+                # Needed to tell personal repos from org repos
+                self.get_authenticated_user()
+            for i, row in to_create:
+                # Extract owner from full_name (e.g., "psenger/repo" -> "psenger")
+                owner = row["full_name"].split("/")[0]
+                # Detect if this is an org repo (owner != authenticated user)
+                is_org = owner != self.authenticated_user["login"]
+                futures[i] = executor.submit(self.create_default_ruleset, owner, row["repo_name"], is_org=is_org)
+                # Smooth the burst to stay clear of GitHub's secondary rate limits
+                time.sleep(0.05)
+
+            for i, row in enumerate(rows, 1):
+                full_name = row["full_name"]
+
+                if not should_apply(row):
+                    outcome = "SKIP (not marked YES)"
+                    results["skipped"] += 1
+                elif row.get("has_ruleset") == "True":
+                    outcome = "SKIP (already protected)"
+                    results["already_protected"] += 1
+                elif dry_run:
+                    outcome = "[DRY RUN] Would apply ruleset"
+                    results["applied"] += 1
+                else:
+                    try:
+                        result = futures[i].result()
+                    except requests.RequestException as e:
+                        result = {"success": False, "error": str(e)}
+                    if result.get("success"):
+                        outcome = "SUCCESS"
+                        results["applied"] += 1
+                    else:
+                        outcome = f"FAILED: {result.get('error', 'Unknown error')[:50]}"
+                        results["failed"] += 1
 
-            if result.get("success"):
-                print("- SUCCESS")
-                results["applied"] += 1
-            else:
-                print(f"- FAILED: {result.get('error', 'Unknown error')[:50]}")
-                results["failed"] += 1
+                level = logging.WARNING if outcome.startswith("FAILED") else logging.INFO
+                logger.log(level, f"[{i}/{total}] {full_name} - {outcome}")
 
         print("\n" + "=" * 70)
         print("APPLY FROM CSV SUMMARY")
@@ -461,15 +764,13 @@ class GitHubRulesetAuditor:
 
     def print_summary(self):
         """Print a summary of the results."""
-        has_ruleset = sum(1 for r in self.manifest if r["has_ruleset"])
-        no_ruleset = sum(1 for r in self.manifest if r["has_ruleset"] is False)
-        errors = sum(1 for r in self.manifest if r["has_ruleset"] is None)
-        created = sum(1 for r in self.manifest if r["action_taken"] == "ruleset_created")
+        has_ruleset, no_ruleset, errors, created = self._count_manifest()
 
         print("\n" + "=" * 70)
         print("SUMMARY")
         print("=" * 70)
-        print(f"Authenticated as: {self.authenticated_user['login']} (ID: {self.authenticated_user_id})")
+        if self.authenticated_user:
+            print(f"Authenticated as: {self.authenticated_user['login']} (ID: {self.authenticated_user_id})")
         print(f"\nTotal repositories scanned: {len(self.manifest)}")
         print(f"  ✓ With ruleset:    {has_ruleset}")
         print(f"  ✗ Without ruleset: {no_ruleset}")
@@ -488,13 +789,28 @@ class GitHubRulesetAuditor:
         print("\n" + "=" * 70)
         print("RULESET CONFIGURATION")
         print("=" * 70)
-        print(f"Bypass actor: {self.authenticated_user['login']} (you can push/merge freely)")
+        if self.authenticated_user:
+            bypass_actor = self.authenticated_user["login"]
+        elif self.is_org:
+            # Org rulesets name the token's user, which audit-only runs never look up
+            bypass_actor = f"your account (the token's user) on {self.owner} repos"
+        else:
+            bypass_actor = self.owner or "the authenticated user"
+        print(f"Bypass actor: {bypass_actor} (you can push/merge freely)")
         print("Rules applied to others:")
         print("  • Cannot delete default branch")
         print("  • Cannot force push")
         print("  • Must open PR with 1 approval")
 
 
+def positive_int(value: str) -> int:
+    """argparse type for counts that must be at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Audit and enforce branch protection rulesets"
@@ -519,9 +835,22 @@ def main():
     parser.add_argument("--visibility", "-v", choices=["public", "private", "all"],
                         default="public",
                         help="Repository visibility filter (default: public)")
+    parser.add_argument("--workers", "-w", type=positive_int, default=10,
+                        help="Number of repos to check concurrently (default: 10)")
+    parser.add_argument("--cache-ttl", type=int, default=3600, metavar="SECONDS",
+                        help="Max age of cached API responses when GitHub sends no "
+                             "cache headers (default: 3600)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Disable the on-disk HTTP cache")
+    parser.add_argument("--quiet", "-q", action="store_true",
+                        help="Only show warnings, errors and the final summary")
 
     args = parser.parse_args()
 
+    # Progress goes through logging so concurrent workers don't interleave output
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO,
+                        format="%(message)s", stream=sys.stdout)
+
     # Get token
     token = args.token or os.environ.get("GITHUB_TOKEN")
     if not token:
@@ -537,7 +866,8 @@ def main():
     os.makedirs(args.output_dir, exist_ok=True)
 
     # Run the auditor
-    auditor = GitHubRulesetAuditor(token)
+    cache_ttl = None if args.no_cache else args.cache_ttl
+    auditor = GitHubRulesetAuditor(token, max_workers=args.workers, cache_ttl=cache_ttl)
 
     # Mode 1: Apply from user-edited CSV file
     if args.from_csv:
@@ -550,13 +880,12 @@ def main():
     # Mode 2: Process single repo (for testing)
     if args.repo:
         owner = args.username or args.org
-        auditor.get_authenticated_user()
         print(f"\nProcessing single repo: {owner}/{args.repo}")
         print("-" * 70)
 
         # Get repo info
         url = f"{auditor.base_url}/repos/{owner}/{args.repo}"
-        response = requests.get(url, headers=auditor.headers)
+        response = auditor._get(url)
         if response.status_code != 200:
             print(f"Error: Could not find repo {owner}/{args.repo}")
             sys.exit(1)
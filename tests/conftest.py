@@ -0,0 +1,20 @@
+"""Shared pytest configuration for GitHub Ruleset Auditor tests."""
+
+import pytest
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--run-integration", action="store_true", default=False,
+        help="run integration tests against the GitHub API (or recorded cassettes)",
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip integration tests unless --run-integration is given."""
+    if config.getoption("--run-integration"):
+        return
+    skip = pytest.mark.skip(reason="need --run-integration to run")
+    for item in items:
+        if "integration" in item.keywords:
+            item.add_marker(skip)
@@ -0,0 +1 @@
+# Integration tests against the real GitHub API
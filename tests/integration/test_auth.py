@@ -0,0 +1,53 @@
+"""
+Integration tests for GitHub Ruleset Auditor
+
+Run with: pytest --run-integration
+Recorded responses are replayed from tests/integration/cassettes/ (see CONTRIBUTING.md).
+"""
+
+import os
+
+import pytest
+
+from github_ruleset_auditor import GitHubRulesetAuditor
+
+
+CASSETTE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cassettes")
+
+
+def has_cassette(name):
+    """True if a recorded API cassette exists for the given test."""
+    return os.path.exists(os.path.join(CASSETTE_DIR, f"{name}.yaml"))
+
+
+@pytest.fixture(scope="module")
+def vcr_config(pytestconfig):
+    """Record missing cassettes unless --record-mode says otherwise, and never write the token into them."""
+    return {
+        "filter_headers": ["authorization"],
+        "record_mode": pytestconfig.getoption("--record-mode") or "once",
+    }
+
+
+@pytest.fixture(scope="module")
+def vcr_cassette_dir():
+    return CASSETTE_DIR
+
+
+@pytest.mark.integration
+@pytest.mark.serial
+class TestIntegration:
+    """Integration tests (need GITHUB_TOKEN to record, or a committed cassette to replay)."""
+
+    @pytest.mark.vcr
+    @pytest.mark.skipif(
+        not os.environ.get("GITHUB_TOKEN") and not has_cassette("TestIntegration.test_can_authenticate"),
+        reason="GITHUB_TOKEN not set and no recorded cassette"
+    )
+    def test_can_authenticate(self):
+        """Should authenticate with real token."""
+        token = os.environ.get("GITHUB_TOKEN", "replayed-from-cassette")
+        auditor = GitHubRulesetAuditor(token)
+        user = auditor.get_authenticated_user()
+        assert "login" in user
+        assert "id" in user
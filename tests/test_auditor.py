@@ -4,16 +4,104 @@ Tests for GitHub Ruleset Auditor
 Run with: pytest tests/ -v
 """
 
+import csv
 import json
+import logging
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import pytest
-from unittest.mock import Mock, patch, MagicMock
-import sys
-import os
-
-# Add parent directory to path so we can import the module
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-from github_ruleset_auditor import GitHubRulesetAuditor, __version__
+import requests
+from unittest.mock import patch
+from requests_cache import CachedSession
+from types import MappingProxyType
+
+from github_ruleset_auditor import GitHubRulesetAuditor, __version__, main, should_apply, should_skip
+
+
+API = "https://api.github.com"
+
+# Ruleset details as returned by GitHub for a ruleset on ~DEFAULT_BRANCH (read-only at
+# every level, shared by tests)
+DEFAULT_BRANCH_RULESET = MappingProxyType({
+    "id": 123,
+    "name": "main-protection",
+    "enforcement": "active",
+    "conditions": MappingProxyType({"ref_name": MappingProxyType({"include": ("~DEFAULT_BRANCH",)})}),
+    "rules": (),
+    "bypass_actors": (),
+})
+
+
+@pytest.fixture(autouse=True)
+def no_network(requests_mock):
+    """Serve every unit test through requests-mock so unregistered URLs fail instead of hitting GitHub."""
+
+
+@pytest.fixture
+def auditor():
+    """A fresh auditor with a dummy token."""
+    return GitHubRulesetAuditor("test_token")
+
+
+@pytest.fixture
+def auditor_with_uid(auditor):
+    """An auditor that already knows the authenticated user's ID."""
+    auditor.authenticated_user_id = 12345
+    return auditor
+
+
+@pytest.fixture
+def auditor_with_manifest(auditor_with_uid):
+    """An auditor with a user and a three-repo manifest: protected, unprotected, and errored."""
+    auditor_with_uid.authenticated_user = {"login": "testuser", "id": 12345}
+    auditor_with_uid.owner = "testuser"
+    auditor_with_uid.manifest = [
+        {"repo_name": "protected", "full_name": "testuser/protected", "default_branch": "main",
+         "html_url": "https://github.com/testuser/protected", "has_ruleset": True,
+         "ruleset_name": "default-branch-protection", "enforcement": "active",
+         "action_taken": None, "error": None},
+        {"repo_name": "open", "full_name": "testuser/open", "default_branch": "main",
+         "html_url": "https://github.com/testuser/open", "has_ruleset": False,
+         "ruleset_name": None, "enforcement": None, "action_taken": None, "error": None},
+        {"repo_name": "broken", "full_name": "testuser/broken", "default_branch": "main",
+         "html_url": "https://github.com/testuser/broken", "has_ruleset": None,
+         "ruleset_name": None, "enforcement": None, "action_taken": None, "error": "500: boom"},
+    ]
+    return auditor_with_uid
+
+
+@pytest.fixture
+def local_api(requests_mock, auditor):
+    """A local HTTP server standing in for api.github.com, reached through the auditor's real adapter.
+
+    Set ``server.status`` and ``server.headers`` for the response; ``server.hits`` counts requests.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            server.hits += 1
+            self.send_response(server.status)
+            for name, value in server.headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.status, server.headers, server.hits = 200, {}, 0
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True)
+    thread.start()
+
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    requests_mock.get(re.compile(re.escape(base_url)), real_http=True)
+    auditor.session.mount("http://", auditor.session.get_adapter(API))
+    auditor.base_url = base_url
+    yield server
+    server.shutdown()
+    server.server_close()
 
 
 class TestVersion:
@@ -34,9 +122,8 @@ class TestVersion:
 class TestGitHubRulesetAuditor:
     """Test the GitHubRulesetAuditor class."""
 
-    def test_init(self):
+    def test_init(self, auditor):
         """Auditor should initialize with a token."""
-        auditor = GitHubRulesetAuditor("test_token")
         assert auditor.token == "test_token"
         assert auditor.base_url == "https://api.github.com"
         assert "Authorization" in auditor.headers
@@ -47,218 +134,717 @@ class TestGitHubRulesetAuditor:
         auditor = GitHubRulesetAuditor("my_secret_token")
         assert auditor.headers["Authorization"] == "token my_secret_token"
 
-    @patch("requests.get")
-    def test_get_authenticated_user_success(self, mock_get):
+    def test_session_reuses_headers(self):
+        """The shared session should send the auth headers on every request."""
+        auditor = GitHubRulesetAuditor("my_secret_token")
+        assert auditor.session.headers["Authorization"] == "token my_secret_token"
+        assert auditor.session.get_adapter("https://api.github.com").max_retries.total == 3
+
+    def test_connection_pool_fits_both_worker_pools(self):
+        """Page prefetching and ruleset checks can each use max_workers connections at once."""
+        auditor = GitHubRulesetAuditor("test_token", max_workers=16)
+        assert auditor.session.get_adapter(API)._pool_maxsize == 32
+
+    def test_cache_disabled_by_default(self, auditor):
+        """Without a TTL the auditor should use a plain, uncached session."""
+        assert not hasattr(auditor.session, "cache")
+
+    def test_cache_enabled_with_ttl(self, tmp_path, monkeypatch):
+        """With a TTL, only GETs should be cached, honoring GitHub's cache headers."""
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+        auditor = GitHubRulesetAuditor("test_token", cache_ttl=60)
+        assert auditor.session.settings.expire_after == 60
+        assert auditor.session.settings.cache_control is True
+        assert auditor.session.settings.allowable_methods == ("GET",)
+        assert "Authorization" in auditor.session.settings.ignored_parameters
+
+    def test_rulesets_are_revalidated_when_cached(self, tmp_path, monkeypatch):
+        """Ruleset reads should always revalidate cached responses with GitHub."""
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+        auditor = GitHubRulesetAuditor("test_token", cache_ttl=60)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"id": 1}'
+
+        with patch.object(CachedSession, "request", return_value=response) as mock_request:
+            auditor.get_repo_rulesets("owner", "repo")
+            auditor.get_ruleset_details("owner", "repo", 1)
+
+        assert [call.kwargs.get("refresh") for call in mock_request.call_args_list] == [True, True]
+
+    def test_get_authenticated_user_success(self, requests_mock, auditor):
         """Should fetch and cache authenticated user."""
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {"login": "testuser", "id": 12345}
-        mock_get.return_value = mock_response
+        requests_mock.get(f"{API}/user", json={"login": "testuser", "id": 12345})
 
-        auditor = GitHubRulesetAuditor("test_token")
         user = auditor.get_authenticated_user()
 
         assert user["login"] == "testuser"
         assert auditor.authenticated_user_id == 12345
-        mock_get.assert_called_once()
+        assert requests_mock.call_count == 1
 
-    @patch("requests.get")
-    def test_get_authenticated_user_caches_result(self, mock_get):
+    def test_get_authenticated_user_caches_result(self, requests_mock, auditor):
         """Should not make duplicate API calls for user info."""
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {"login": "testuser", "id": 12345}
-        mock_get.return_value = mock_response
+        auditor.authenticated_user = {"login": "testuser", "id": 12345}
 
-        auditor = GitHubRulesetAuditor("test_token")
-        auditor.get_authenticated_user()
-        auditor.get_authenticated_user()  # Second call
+        # Already fetched, so no request is made (none is registered)
+        assert auditor.get_authenticated_user() is auditor.authenticated_user
+        assert requests_mock.call_count == 0
 
-        # Should only call API once due to caching
-        assert mock_get.call_count == 1
 
+class TestRateLimiting:
+    """Test waiting out GitHub rate limits."""
 
-class TestRulesetDetection:
-    """Test ruleset detection logic."""
-
-    @patch("requests.get")
-    def test_get_repo_rulesets_success(self, mock_get):
-        """Should return rulesets when API call succeeds."""
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = [
-            {"id": 1, "name": "protection-rule"}
-        ]
-        mock_get.return_value = mock_response
+    @patch("time.sleep")
+    def test_retries_after_retry_after_header(self, mock_sleep, requests_mock, auditor):
+        """Should sleep for Retry-After seconds and retry a 429."""
+        requests_mock.get(f"{API}/repos/owner/repo/rulesets", [
+            {"status_code": 429, "headers": {"Retry-After": "7"}},
+            {"json": [{"id": 1, "name": "protection-rule"}]},
+        ])
 
-        auditor = GitHubRulesetAuditor("test_token")
         rulesets = auditor.get_repo_rulesets("owner", "repo")
 
-        assert len(rulesets) == 1
-        assert rulesets[0]["name"] == "protection-rule"
+        assert rulesets[0]["id"] == 1
+        mock_sleep.assert_called_once_with(7.0)
 
-    @patch("requests.get")
-    def test_get_repo_rulesets_404_returns_empty(self, mock_get):
-        """Should return empty list when repo has no rulesets endpoint."""
-        mock_response = Mock()
-        mock_response.status_code = 404
-        mock_get.return_value = mock_response
+    @patch("time.time", return_value=1000.0)
+    @patch("time.sleep")
+    def test_waits_for_rate_limit_reset(self, mock_sleep, mock_time, requests_mock, auditor):
+        """Should sleep until X-RateLimit-Reset when the quota is exhausted."""
+        requests_mock.get(f"{API}/user", [
+            {"status_code": 403, "headers": {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "1030"}},
+            {"json": {"login": "testuser", "id": 12345}},
+        ])
 
-        auditor = GitHubRulesetAuditor("test_token")
-        rulesets = auditor.get_repo_rulesets("owner", "repo")
+        auditor.get_authenticated_user()
 
-        assert rulesets == []
+        mock_sleep.assert_called_once_with(31.0)
 
-    @patch("requests.get")
-    def test_get_repo_rulesets_error(self, mock_get):
-        """Should return error dict on API failure."""
-        mock_response = Mock()
-        mock_response.status_code = 500
-        mock_response.text = "Internal Server Error"
-        mock_get.return_value = mock_response
+    @patch("time.sleep")
+    def test_plain_403_is_not_retried(self, mock_sleep, requests_mock, auditor):
+        """A permissions 403 without rate-limit headers should be returned as-is."""
+        requests_mock.get(f"{API}/repos/owner/repo/rulesets", status_code=403, text="Forbidden",
+                          headers={"X-RateLimit-Remaining": "4999"})
 
-        auditor = GitHubRulesetAuditor("test_token")
         result = auditor.get_repo_rulesets("owner", "repo")
 
         assert "error" in result
+        mock_sleep.assert_not_called()
+
+    @patch("time.sleep")
+    def test_persistent_5xx_is_returned_after_retries(self, mock_sleep, local_api, auditor):
+        """Once the adapter's 5xx retries run out, the last response should be reported, not raised."""
+        local_api.status = 502
+
+        result = auditor.get_repo_rulesets("owner", "repo")
+
+        assert result["error"].startswith("502")
+        assert local_api.hits == 4
+
+    @patch("time.sleep")
+    def test_retry_after_is_only_honored_once(self, mock_sleep, local_api, auditor):
+        """The adapter should leave 429 + Retry-After to the auditor instead of retrying it too."""
+        local_api.status = 429
+        local_api.headers = {"Retry-After": "60"}
+
+        auditor.get_repo_rulesets("owner", "repo")
+
+        # The first request plus the auditor's three waits; the adapter adds no retries of its own
+        assert local_api.hits == 4
+        assert [c.args[0] for c in mock_sleep.call_args_list] == [60.0, 60.0, 60.0]
+
+
+class TestRulesetDetection:
+    """Test ruleset detection logic."""
+
+    @pytest.mark.parametrize("response, expected", [
+        pytest.param({"json": [{"id": 1, "name": "protection-rule"}]}, [{"id": 1, "name": "protection-rule"}],
+                     id="success"),
+        pytest.param({"status_code": 404}, [], id="no-rulesets-endpoint"),
+        pytest.param({"status_code": 500, "text": "Internal Server Error"}, {"error": "500: Internal Server Error"},
+                     id="error"),
+    ])
+    def test_get_repo_rulesets(self, response, expected, requests_mock, auditor):
+        """Should return rulesets, an empty list on 404, or an error dict on API failure."""
+        requests_mock.get(f"{API}/repos/owner/repo/rulesets", **response)
+
+        assert auditor.get_repo_rulesets("owner", "repo") == expected
 
     @patch.object(GitHubRulesetAuditor, "get_repo_rulesets")
     @patch.object(GitHubRulesetAuditor, "get_ruleset_details")
-    def test_check_default_branch_ruleset_finds_match(self, mock_details, mock_rulesets):
+    def test_check_default_branch_ruleset_finds_match(self, mock_details, mock_rulesets, auditor):
         """Should detect ruleset targeting default branch."""
         mock_rulesets.return_value = [{"id": 123, "name": "main-protection"}]
-        mock_details.return_value = {
-            "id": 123,
-            "name": "main-protection",
-            "enforcement": "active",
-            "conditions": {
-                "ref_name": {
-                    "include": ["~DEFAULT_BRANCH"]
-                }
-            },
-            "rules": [],
-            "bypass_actors": []
-        }
+        mock_details.return_value = DEFAULT_BRANCH_RULESET
 
-        auditor = GitHubRulesetAuditor("test_token")
         result = auditor.check_default_branch_ruleset("owner", "repo", "main")
 
         assert result["has_ruleset"] is True
         assert result["ruleset_name"] == "main-protection"
 
     @patch.object(GitHubRulesetAuditor, "get_repo_rulesets")
-    def test_check_default_branch_ruleset_no_rulesets(self, mock_rulesets):
+    @patch.object(GitHubRulesetAuditor, "get_ruleset_details")
+    def test_check_default_branch_ruleset_matches_branch_name(self, mock_details, mock_rulesets, auditor):
+        """Should detect rulesets that name the branch instead of ~DEFAULT_BRANCH."""
+        mock_rulesets.return_value = [{"id": 1}, {"id": 2}]
+        mock_details.side_effect = [
+            {"id": 1, "name": "dev", "conditions": {"ref_name": {"include": ["refs/heads/develop"]}}},
+            {"id": 2, "name": "trunk", "conditions": {"ref_name": {"include": ["refs/heads/main"]}}},
+        ]
+
+        result = auditor.check_default_branch_ruleset("owner", "repo", "main")
+
+        assert result["has_ruleset"] is True
+        assert result["ruleset_name"] == "trunk"
+
+    @patch.object(GitHubRulesetAuditor, "get_repo_rulesets")
+    @patch.object(GitHubRulesetAuditor, "get_ruleset_details")
+    def test_check_default_branch_ruleset_fetches_likely_match_first(self, mock_details, mock_rulesets, auditor):
+        """Should fetch protection-named rulesets first and stop at the first match."""
+        mock_rulesets.return_value = [
+            {"id": 1, "name": "feature-work", "target": "branch"},
+            {"id": 2, "name": "release-flow", "target": "branch"},
+            {"id": 123, "name": "main-protection", "target": "branch"},
+        ]
+        mock_details.return_value = DEFAULT_BRANCH_RULESET
+
+        result = auditor.check_default_branch_ruleset("owner", "repo", "main")
+
+        assert result["ruleset_id"] == 123
+        mock_details.assert_called_once_with("owner", "repo", 123)
+
+    @patch.object(GitHubRulesetAuditor, "get_repo_rulesets")
+    @patch.object(GitHubRulesetAuditor, "get_ruleset_details")
+    def test_check_default_branch_ruleset_skips_non_branch_targets(self, mock_details, mock_rulesets, auditor):
+        """Should not fetch details for tag or push rulesets."""
+        mock_rulesets.return_value = [
+            {"id": 1, "name": "release-tags", "target": "tag"},
+            {"id": 2, "name": "push-rules", "target": "push"},
+        ]
+
+        result = auditor.check_default_branch_ruleset("owner", "repo", "main")
+
+        assert result["has_ruleset"] is False
+        mock_details.assert_not_called()
+
+    @patch.object(GitHubRulesetAuditor, "get_repo_rulesets")
+    def test_check_default_branch_ruleset_no_rulesets(self, mock_rulesets, auditor):
         """Should return has_ruleset=False when no rulesets exist."""
         mock_rulesets.return_value = []
 
-        auditor = GitHubRulesetAuditor("test_token")
         result = auditor.check_default_branch_ruleset("owner", "repo", "main")
 
         assert result["has_ruleset"] is False
 
 
+class TestGraphQLRulesets:
+    """Test bulk ruleset lookup via GraphQL."""
+
+    def test_query_rulesets_bulk_parses_rulesets(self, requests_mock, auditor):
+        """Should map each aliased repo to REST-shaped rulesets."""
+        requests_mock.post(f"{API}/graphql", json={"data": {
+            "r0": {"rulesets": {"pageInfo": {"hasNextPage": False}, "nodes": [{
+                "databaseId": 42, "name": "main-protection", "target": "BRANCH",
+                "enforcement": "ACTIVE",
+                "conditions": {"refName": {"include": ["~DEFAULT_BRANCH"], "exclude": []}},
+                "rules": {"nodes": [{"type": "DELETION"}]},
+                "bypassActors": {"nodes": [{"bypassMode": "ALWAYS"}]},
+            }]}},
+            "r1": {"rulesets": {"pageInfo": {"hasNextPage": False}, "nodes": []}},
+        }})
+
+        result = auditor.query_rulesets_bulk([("owner", "protected"), ("owner", "open")])
+
+        assert result[("owner", "open")] == []
+        ruleset = result[("owner", "protected")][0]
+        assert ruleset["id"] == 42
+        assert ruleset["target"] == "branch"
+        assert ruleset["enforcement"] == "active"
+        assert ruleset["rules"] == [{"type": "deletion"}]
+        payload = requests_mock.last_request.json()
+        assert payload["variables"] == {"o0": "owner", "n0": "protected", "o1": "owner", "n1": "open"}
+
+    def test_query_rulesets_bulk_omits_unresolved_repos(self, requests_mock, auditor):
+        """Repos with errors or truncated ruleset lists should be left for REST."""
+        requests_mock.post(f"{API}/graphql", json={
+            "data": {
+                "r0": None,
+                "r1": {"rulesets": {"pageInfo": {"hasNextPage": True}, "nodes": []}},
+            },
+            "errors": [{"type": "NOT_FOUND", "path": ["r0"]}],
+        })
+
+        result = auditor.query_rulesets_bulk([("owner", "missing"), ("owner", "busy")])
+
+        assert result == {}
+
+    def test_query_rulesets_bulk_http_error_returns_empty(self, requests_mock, auditor):
+        """A failed GraphQL request should leave every repo for REST."""
+        requests_mock.post(f"{API}/graphql", status_code=502)
+
+        assert auditor.query_rulesets_bulk([("owner", "repo")]) == {}
+
+    def test_query_rulesets_bulk_omits_repos_with_null_fields(self, requests_mock, auditor):
+        """Rulesets with fields withheld by GitHub (null plus an error) should be left for REST."""
+        requests_mock.post(f"{API}/graphql", json={
+            "data": {
+                "r0": {"rulesets": {"pageInfo": {"hasNextPage": False}, "nodes": [{
+                    "databaseId": 42, "name": "main-protection", "target": "BRANCH", "enforcement": "ACTIVE",
+                    "conditions": {"refName": {"include": ["~DEFAULT_BRANCH"], "exclude": []}},
+                    "rules": {"nodes": [{"type": "DELETION"}]},
+                    "bypassActors": None,
+                }]}},
+                "r1": {"rulesets": {"pageInfo": {"hasNextPage": False}, "nodes": []}},
+            },
+            "errors": [{"type": "FORBIDDEN", "path": ["r0", "rulesets", "nodes", 0, "bypassActors"]}],
+        })
+
+        result = auditor.query_rulesets_bulk([("owner", "restricted"), ("owner", "open")])
+
+        assert result == {("owner", "open"): []}
+
+    @pytest.mark.parametrize("response", [
+        pytest.param({"exc": requests.exceptions.ConnectionError}, id="connection-error"),
+        pytest.param({"text": "<html>unicorn</html>"}, id="non-json-body"),
+    ])
+    def test_query_rulesets_bulk_request_failure_returns_empty(self, response, requests_mock, auditor):
+        """Network errors and unparseable bodies should leave every repo for REST."""
+        requests_mock.post(f"{API}/graphql", **response)
+
+        assert auditor.query_rulesets_bulk([("owner", "repo")]) == {}
+
+    def test_find_default_branch_ruleset(self, auditor):
+        """Should match fetched rulesets on the default branch, ignoring other targets."""
+        rulesets = [
+            {"id": 1, "name": "tags", "target": "tag",
+             "conditions": {"ref_name": {"include": ["~DEFAULT_BRANCH"]}}},
+            {"id": 2, "name": "trunk", "target": "branch",
+             "conditions": {"ref_name": {"include": ["refs/heads/trunk"]}}},
+        ]
+
+        assert auditor.find_default_branch_ruleset(rulesets, "main")["has_ruleset"] is False
+        assert auditor.find_default_branch_ruleset(rulesets, "trunk")["ruleset_id"] == 2
+
+
 class TestRulesetCreation:
     """Test ruleset creation logic."""
 
-    @patch("requests.post")
-    def test_create_default_ruleset_success(self, mock_post):
-        """Should create ruleset and return success."""
-        mock_response = Mock()
-        mock_response.status_code = 201
-        mock_response.json.return_value = {"id": 999, "name": "default-branch-protection"}
-        mock_post.return_value = mock_response
-
-        auditor = GitHubRulesetAuditor("test_token")
-        auditor.authenticated_user_id = 12345
-        result = auditor.create_default_ruleset("owner", "repo")
-
-        assert result["success"] is True
-        assert result["ruleset"]["id"] == 999
-
-    @patch("requests.post")
-    def test_create_default_ruleset_failure(self, mock_post):
-        """Should return error on failure."""
-        mock_response = Mock()
-        mock_response.status_code = 422
-        mock_response.text = "Validation failed"
-        mock_post.return_value = mock_response
-
-        auditor = GitHubRulesetAuditor("test_token")
-        auditor.authenticated_user_id = 12345
-        result = auditor.create_default_ruleset("owner", "repo")
-
-        assert result["success"] is False
-        assert "error" in result
+    @pytest.mark.parametrize("response, expected", [
+        pytest.param({"status_code": 201, "json": {"id": 999, "name": "default-branch-protection"}},
+                     {"success": True, "ruleset": {"id": 999, "name": "default-branch-protection"}}, id="created"),
+        pytest.param({"status_code": 422, "text": "Validation failed"},
+                     {"success": False, "error": "422: Validation failed"}, id="rejected"),
+    ])
+    def test_create_default_ruleset(self, response, expected, requests_mock, auditor_with_uid):
+        """Should POST the default ruleset and report success or the API error."""
+        requests_mock.post(f"{API}/repos/owner/repo/rulesets", **response)
+
+        assert auditor_with_uid.create_default_ruleset("owner", "repo") == expected
+        sent = requests_mock.last_request
+        assert sent.json()["bypass_actors"] == [{"actor_id": 5, "actor_type": "RepositoryRole", "bypass_mode": "always"}]
+        assert sent.headers["Content-Type"] == "application/json"
+
+    @patch.object(GitHubRulesetAuditor, "get_authenticated_user")
+    def test_create_org_ruleset_fetches_user_on_demand(self, mock_user, requests_mock, auditor):
+        """Org rulesets should fetch the user ID for the bypass actor only when needed."""
+        def fetch_user():
+            auditor.authenticated_user = {"login": "testuser", "id": 12345}
+            auditor.authenticated_user_id = 12345
+        mock_user.side_effect = fetch_user
+        requests_mock.post(f"{API}/repos/owner/repo/rulesets", status_code=201, json={"id": 999})
+        requests_mock.post(f"{API}/repos/someorg/repo/rulesets", status_code=201, json={"id": 999})
+
+        auditor.create_default_ruleset("owner", "repo")
+        mock_user.assert_not_called()
+
+        auditor.create_default_ruleset("someorg", "repo", is_org=True)
+        mock_user.assert_called_once()
+        bypass = requests_mock.last_request.json()["bypass_actors"][0]
+        assert (bypass["actor_type"], bypass["actor_id"]) == ("User", 12345)
+
+
+class TestGetRepos:
+    """Test repository listing and pagination."""
+
+    def test_get_repos_fetches_all_pages_from_link_header(self, requests_mock, auditor):
+        """Should read the last page from the Link header and fetch every page."""
+        def page_repos(request, context):
+            page = request.qs["page"][0]
+            if page == "1":
+                context.headers["Link"] = f'<{API}/users/owner/repos?type=public&per_page=100&page=3>; rel="last"'
+            return [
+                {"name": f"repo{page}", "full_name": f"owner/repo{page}",
+                 "html_url": f"https://github.com/owner/repo{page}", "private": False}
+            ]
+
+        requests_mock.get(f"{API}/users/owner/repos", json=page_repos)
+
+        repos = auditor.get_repos(username="owner")
+
+        assert [r["name"] for r in repos] == ["repo1", "repo2", "repo3"]
+        assert sorted(r.qs["page"][0] for r in requests_mock.request_history) == ["1", "2", "3"]
+
+    def test_iter_repos_bounds_pages_in_flight(self, requests_mock):
+        """Only about max_workers pages should be fetched ahead of the consumer."""
+        def page_repos(request, context):
+            page = request.qs["page"][0]
+            if page == "1":
+                context.headers["Link"] = f'<{API}/users/owner/repos?page=30>; rel="last"'
+            return [{"name": f"repo{page}", "full_name": f"owner/repo{page}",
+                     "html_url": f"https://github.com/owner/repo{page}", "private": False}]
+
+        requests_mock.get(f"{API}/users/owner/repos", json=page_repos)
+        auditor = GitHubRulesetAuditor("test_token", max_workers=2)
+
+        repos = auditor.iter_repos(username="owner")
+        next(repos)
+        time.sleep(0.1)  # give the prefetch threads time to run
+
+        # Page 1 plus two prefetched pages, not all 29 remaining
+        assert requests_mock.call_count == 3
+        assert len(list(repos)) == 29
+
+    def test_iter_repos_yields_page_by_page(self, requests_mock, auditor):
+        """Should yield page 1's repos before the caller consumes later pages."""
+        requests_mock.get(f"{API}/users/owner/repos", [
+            {"json": [{"name": "repo1", "full_name": "owner/repo1",
+                       "html_url": "https://github.com/owner/repo1", "private": False}],
+             "headers": {"Link": f'<{API}/users/owner/repos?page=2>; rel="last"'}},
+            {"json": [{"name": "repo2", "full_name": "owner/repo2",
+                       "html_url": "https://github.com/owner/repo2", "private": False}]},
+        ])
+
+        repos = auditor.iter_repos(username="owner")
+
+        assert next(repos)["name"] == "repo1"
+        assert [r["name"] for r in repos] == ["repo2"]
+
+    def test_get_repos_single_page(self, requests_mock, auditor):
+        """Should make one request when there is no Link header."""
+        requests_mock.get(f"{API}/users/owner/repos", json=[
+            {"name": "repo", "full_name": "owner/repo", "html_url": "https://github.com/owner/repo", "private": False},
+            {"name": "old", "full_name": "owner/old", "html_url": "https://github.com/owner/old",
+             "private": False, "archived": True},
+        ])
+
+        repos = auditor.get_repos(username="owner")
+
+        assert [r["name"] for r in repos] == ["repo"]
+        assert requests_mock.call_count == 1
+
+    def test_get_repos_reports_skipped_counts(self, requests_mock, caplog, auditor):
+        """Per-page output should count archived and forked repos separately."""
+        requests_mock.get(f"{API}/orgs/org/repos", json=[
+            {"name": "repo", "full_name": "org/repo", "html_url": "https://github.com/org/repo", "private": True},
+            {"name": "old", "full_name": "org/old", "archived": True},
+            {"name": "copy", "full_name": "org/copy", "fork": True},
+            {"name": "site", "full_name": "org/site", "html_url": "https://github.com/org/site", "private": False},
+        ])
+
+        with caplog.at_level(logging.INFO, logger="github_ruleset_auditor"):
+            repos = auditor.get_repos(org="org", visibility="private")
+
+        assert [r["name"] for r in repos] == ["repo"]
+        assert requests_mock.last_request.qs["type"] == ["private"]
+        assert "  Page 1: 1 repos (skipped 1 archived, 1 forked)" in caplog.messages
+
+    def test_get_repos_keeps_only_used_fields(self, requests_mock, auditor):
+        """Repo dicts should be trimmed to the fields the auditor reads."""
+        requests_mock.get(f"{API}/users/owner/repos", json=[{
+            "name": "repo", "full_name": "owner/repo", "html_url": "https://github.com/owner/repo",
+            "default_branch": "trunk", "private": False, "owner": {"login": "owner"},
+            "permissions": {"admin": True}, "topics": ["cli"],
+        }])
+
+        repos = auditor.get_repos(username="owner")
+
+        assert repos == [{
+            "name": "repo", "full_name": "owner/repo", "default_branch": "trunk",
+            "html_url": "https://github.com/owner/repo", "private": False,
+        }]
+
+
+class TestProcessRepos:
+    """Test the full audit pass."""
+
+    @patch.object(GitHubRulesetAuditor, "query_rulesets_bulk", return_value={})
+    @patch.object(GitHubRulesetAuditor, "check_default_branch_ruleset")
+    @patch.object(GitHubRulesetAuditor, "iter_repos")
+    @patch.object(GitHubRulesetAuditor, "get_authenticated_user")
+    def test_process_repos_keeps_repo_order(self, mock_user, mock_repos, mock_check, mock_bulk):
+        """Concurrent checks should still produce the manifest in repo order."""
+        mock_repos.return_value = [
+            {"name": f"repo{i}", "full_name": f"owner/repo{i}",
+             "default_branch": "main", "html_url": f"https://github.com/owner/repo{i}"}
+            for i in range(5)
+        ]
+        mock_check.side_effect = lambda owner, repo, branch: {"has_ruleset": repo == "repo3"}
+
+        auditor = GitHubRulesetAuditor("test_token", max_workers=3)
+        manifest = auditor.process_repos(username="owner")
+
+        assert [e["repo_name"] for e in manifest] == [f"repo{i}" for i in range(5)]
+        assert [e["has_ruleset"] for e in manifest] == [False, False, False, True, False]
+        assert mock_check.call_count == 5
+        # Audit-only runs don't need the authenticated user
+        mock_user.assert_not_called()
+
+    @patch.object(GitHubRulesetAuditor, "query_rulesets_bulk")
+    @patch.object(GitHubRulesetAuditor, "check_default_branch_ruleset")
+    @patch.object(GitHubRulesetAuditor, "iter_repos")
+    @patch.object(GitHubRulesetAuditor, "get_authenticated_user")
+    def test_process_repos_uses_graphql_then_rest_fallback(self, mock_user, mock_repos, mock_check, mock_bulk, auditor):
+        """Repos resolved by GraphQL should skip REST; the rest should fall back."""
+        mock_repos.return_value = [
+            {"name": name, "full_name": f"owner/{name}", "default_branch": "main",
+             "html_url": f"https://github.com/owner/{name}"}
+            for name in ("graphql", "rest")
+        ]
+        mock_bulk.return_value = {("owner", "graphql"): [{
+            "id": 7, "name": "main-protection", "target": "branch", "enforcement": "active",
+            "conditions": {"ref_name": {"include": ["~DEFAULT_BRANCH"], "exclude": []}},
+            "rules": [], "bypass_actors": [{"bypass_mode": "always"}],
+        }]}
+        mock_check.return_value = {"has_ruleset": False}
+
+        manifest = auditor.process_repos(username="owner")
+
+        mock_bulk.assert_called_once_with([("owner", "graphql"), ("owner", "rest")])
+        mock_check.assert_called_once_with("owner", "rest", "main")
+        assert manifest[0]["ruleset_name"] == "main-protection"
+        assert manifest[0]["bypass_actors_count"] == 1
+        assert manifest[1]["has_ruleset"] is False
+
+    @patch.object(GitHubRulesetAuditor, "query_rulesets_bulk", return_value={})
+    @patch.object(GitHubRulesetAuditor, "check_default_branch_ruleset")
+    @patch.object(GitHubRulesetAuditor, "iter_repos")
+    def test_process_repos_checks_before_pagination_finishes(self, mock_repos, mock_check, mock_bulk, auditor):
+        """Checks should start on the first chunks without draining the repo generator."""
+        yielded = []
+
+        def repos(**kwargs):
+            for i in range(6):
+                yielded.append(i)
+                yield {"name": f"repo{i}", "full_name": f"owner/repo{i}", "default_branch": "main",
+                       "html_url": f"https://github.com/owner/repo{i}"}
+
+        mock_repos.side_effect = repos
+        consumed_at_check = []
+        mock_check.side_effect = lambda owner, repo, branch: consumed_at_check.append(len(yielded)) or {}
+
+        auditor.process_repos(username="owner", chunk_size=2)
+
+        # The first chunk is checked with only one chunk of lookahead consumed
+        assert min(consumed_at_check) <= 4
+        assert len(consumed_at_check) == 6
+
+    @patch.object(GitHubRulesetAuditor, "query_rulesets_bulk", return_value={})
+    @patch.object(GitHubRulesetAuditor, "check_default_branch_ruleset", return_value={"error": "500: boom"})
+    @patch.object(GitHubRulesetAuditor, "iter_repos")
+    def test_process_repos_logs_check_errors_as_warnings(self, mock_repos, mock_check, mock_bulk, caplog, auditor):
+        """Check errors should survive --quiet (WARNING level) and name the repo."""
+        mock_repos.return_value = [{"name": "repo", "full_name": "owner/repo", "default_branch": "main",
+                                    "html_url": "https://github.com/owner/repo"}]
+
+        with caplog.at_level(logging.WARNING, logger="github_ruleset_auditor"):
+            auditor.process_repos(username="owner")
+
+        assert caplog.messages == ["    ⚠ Error checking owner/repo: 500: boom"]
+
+
+class TestManifest:
+    """Test manifest output files."""
+
+    def test_count_manifest(self, auditor_with_manifest):
+        """Should count each ruleset status and created rulesets in one pass."""
+        auditor_with_manifest.manifest[1]["action_taken"] = "ruleset_created"
+        assert auditor_with_manifest._count_manifest() == (1, 1, 1, 1)
+
+    def test_save_manifest_json(self, tmp_path, auditor_with_manifest):
+        """JSON manifest should contain the summary counts and every repo."""
+        json_path, _ = auditor_with_manifest.save_manifest(str(tmp_path))
+
+        with open(json_path) as f:
+            data = json.load(f)
+
+        assert data["owner"] == "testuser"
+        assert data["authenticated_user"] == "testuser"
+        assert data["total_repos"] == 3
+        assert (data["with_ruleset"], data["without_ruleset"], data["errors"]) == (1, 1, 1)
+        assert [r["repo_name"] for r in data["repositories"]] == ["protected", "open", "broken"]
+
+    def test_save_manifest_json_audit_only(self, tmp_path, auditor_with_manifest):
+        """Audit-only runs record the audited owner, with no authenticated user."""
+        auditor_with_manifest.authenticated_user = auditor_with_manifest.authenticated_user_id = None
+        json_path, _ = auditor_with_manifest.save_manifest(str(tmp_path))
+
+        with open(json_path) as f:
+            data = json.load(f)
+
+        assert (data["owner"], data["authenticated_user"], data["authenticated_user_id"]) == ("testuser", None, None)
+
+    def test_save_manifest_csv(self, tmp_path, auditor_with_manifest):
+        """CSV manifest should default apply_protection to YES only for unprotected repos."""
+        _, csv_path = auditor_with_manifest.save_manifest(str(tmp_path))
+
+        with open(csv_path, newline="") as f:
+            rows = list(csv.DictReader(f))
+
+        assert [r["repo_name"] for r in rows] == ["protected", "open", "broken"]
+        assert [r["apply_protection"] for r in rows] == ["NO", "YES", "YES"]
+
+
+class TestApplyFromCSV:
+    """Test applying rulesets from an edited CSV manifest."""
+
+    def _write_csv(self, tmp_path, rows):
+        csv_path = tmp_path / "manifest.csv"
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["repo_name", "full_name", "has_ruleset", "apply_protection"])
+            writer.writeheader()
+            writer.writerows(rows)
+        return str(csv_path)
+
+    @patch("time.sleep")
+    @patch.object(GitHubRulesetAuditor, "create_default_ruleset")
+    @patch.object(GitHubRulesetAuditor, "get_authenticated_user")
+    def test_apply_from_csv_counts_results(self, mock_user, mock_create, mock_sleep, tmp_path, auditor):
+        """Should create rulesets only for YES rows without one and tally each outcome."""
+        csv_path = self._write_csv(tmp_path, [
+            {"repo_name": "a", "full_name": "testuser/a", "has_ruleset": "False", "apply_protection": "YES"},
+            {"repo_name": "b", "full_name": "testuser/b", "has_ruleset": "False", "apply_protection": "NO"},
+            {"repo_name": "c", "full_name": "testuser/c", "has_ruleset": "True", "apply_protection": "YES"},
+            {"repo_name": "d", "full_name": "someorg/d", "has_ruleset": "False", "apply_protection": "YES"},
+        ])
+        mock_create.side_effect = lambda owner, repo, is_org: (
+            {"success": True} if repo == "a" else {"success": False, "error": "422: nope"}
+        )
+
+        auditor.authenticated_user = {"login": "testuser", "id": 12345}
+        results = auditor.apply_from_csv(csv_path)
+
+        assert results == {"applied": 1, "skipped": 1, "failed": 1, "already_protected": 1}
+        assert sorted(c.args + (c.kwargs["is_org"],) for c in mock_create.call_args_list) == [
+            ("someorg", "d", True), ("testuser", "a", False),
+        ]
+
+    @patch("time.sleep")
+    def test_apply_from_csv_counts_request_errors_as_failures(self, mock_sleep, requests_mock, tmp_path,
+                                                             capsys, auditor):
+        """A request that raises should fail only its own row; later rows are still logged and counted."""
+        csv_path = self._write_csv(tmp_path, [
+            {"repo_name": name, "full_name": f"testuser/{name}", "has_ruleset": "False", "apply_protection": "YES"}
+            for name in "abcd"
+        ])
+        for name in "acd":
+            requests_mock.post(f"{API}/repos/testuser/{name}/rulesets", status_code=201, json={"id": 1})
+        requests_mock.post(f"{API}/repos/testuser/b/rulesets", exc=requests.exceptions.ConnectionError)
+
+        auditor.authenticated_user = {"login": "testuser", "id": 12345}
+        results = auditor.apply_from_csv(csv_path)
+
+        assert results == {"applied": 3, "skipped": 0, "failed": 1, "already_protected": 0}
+        assert "APPLY FROM CSV SUMMARY" in capsys.readouterr().out
+
+    @patch.object(GitHubRulesetAuditor, "create_default_ruleset")
+    @patch.object(GitHubRulesetAuditor, "get_authenticated_user")
+    def test_apply_from_csv_dry_run_makes_no_changes(self, mock_user, mock_create, tmp_path, auditor):
+        """Dry run should count would-be applies without creating anything."""
+        csv_path = self._write_csv(tmp_path, [
+            {"repo_name": "a", "full_name": "testuser/a", "has_ruleset": "False", "apply_protection": "YES"},
+        ])
+
+        results = auditor.apply_from_csv(csv_path, dry_run=True)
+
+        assert results["applied"] == 1
+        mock_create.assert_not_called()
+        mock_user.assert_not_called()
+
+    @patch("time.sleep")
+    @patch.object(GitHubRulesetAuditor, "create_default_ruleset")
+    @patch.object(GitHubRulesetAuditor, "get_authenticated_user")
+    def test_apply_from_csv_logs_failures_as_warnings(self, mock_user, mock_create, mock_sleep,
+                                                      tmp_path, caplog, auditor):
+        """Failed applies should stay visible when progress output is quiet."""
+        csv_path = self._write_csv(tmp_path, [
+            {"repo_name": "a", "full_name": "testuser/a", "has_ruleset": "False", "apply_protection": "YES"},
+            {"repo_name": "b", "full_name": "testuser/b", "has_ruleset": "False", "apply_protection": "NO"},
+        ])
+        mock_create.return_value = {"success": False, "error": "422: Validation failed"}
+
+        auditor.authenticated_user = {"login": "testuser", "id": 12345}
+        with caplog.at_level(logging.WARNING, logger="github_ruleset_auditor"):
+            auditor.apply_from_csv(csv_path)
+
+        assert [r.getMessage() for r in caplog.records] == ["[1/2] testuser/a - FAILED: 422: Validation failed"]
+
+
+class TestSummary:
+    """Test the printed summary."""
+
+    @pytest.mark.parametrize("owner, is_org, bypass_actor", [
+        pytest.param("octocat", False, "octocat", id="user"),
+        pytest.param("github", True, "your account (the token's user) on github repos", id="org"),
+    ])
+    def test_print_summary_without_authenticated_user(self, owner, is_org, bypass_actor, capsys, auditor):
+        """Audit-only runs never fetch the user, so describe the bypass actor from the audited owner."""
+        auditor.owner, auditor.is_org = owner, is_org
+        auditor.manifest = [{"full_name": f"{owner}/repo", "has_ruleset": False, "action_taken": None}]
+
+        auditor.print_summary()
+
+        output = capsys.readouterr().out
+        assert "Authenticated as" not in output
+        assert f"Bypass actor: {bypass_actor} (" in output
+        assert f"  - {owner}/repo" in output
+
+
+class TestCommandLine:
+    """Test command-line argument validation."""
+
+    @pytest.mark.parametrize("workers", ["0", "-3"])
+    def test_workers_must_be_positive(self, workers, capsys):
+        """A worker count below 1 should be rejected by argparse, not crash the thread pool."""
+        with patch("sys.argv", ["github-ruleset-auditor", "-u", "octocat", "-w", workers]):
+            with pytest.raises(SystemExit) as exc:
+                main()
+
+        assert exc.value.code == 2
+        assert "must be at least 1" in capsys.readouterr().err
 
 
 class TestCSVParsing:
     """Test CSV manifest parsing."""
 
-    def test_parse_csv_row_yes(self):
-        """Should correctly identify YES rows."""
-        row = {
-            "full_name": "owner/repo",
-            "default_branch": "main",
-            "has_ruleset": "False",
-            "apply_protection": "YES"
-        }
-        # Test the logic that would be in apply_from_csv
-        should_apply = row.get("apply_protection", "").strip().upper() == "YES"
-        assert should_apply is True
-
-    def test_parse_csv_row_no(self):
-        """Should correctly identify NO rows."""
+    @pytest.mark.parametrize("value, expected", [
+        ("YES", True),
+        ("NO", False),
+        ("", False),
+    ])
+    def test_parse_csv_row(self, value, expected):
+        """Only rows marked YES should be applied."""
         row = {
             "full_name": "owner/repo",
             "default_branch": "main",
             "has_ruleset": "False",
-            "apply_protection": "NO"
+            "apply_protection": value
         }
-        should_apply = row.get("apply_protection", "").strip().upper() == "YES"
-        assert should_apply is False
+        assert should_apply(row) is expected
 
-    def test_parse_csv_row_case_insensitive(self):
-        """YES should be case-insensitive."""
-        for value in ["yes", "Yes", "YES", "  yes  ", "  YES  "]:
-            row = {"apply_protection": value}
-            should_apply = row.get("apply_protection", "").strip().upper() == "YES"
-            assert should_apply is True, f"Failed for value: {value!r}"
+    @pytest.mark.parametrize("value", ["yes", "Yes", "YES", "  yes  ", "  YES  "])
+    def test_parse_csv_row_case_insensitive(self, value):
+        """YES should be case-insensitive and ignore surrounding whitespace."""
+        assert should_apply({"apply_protection": value}) is True
 
 
 class TestRepoFiltering:
     """Test repository filtering logic."""
 
-    def test_should_skip_archived_repos(self):
-        """Archived repos should be skipped."""
-        repo = {"archived": True, "fork": False}
-        should_skip = repo.get("archived") or repo.get("fork")
-        assert should_skip is True
-
-    def test_should_skip_forked_repos(self):
-        """Forked repos should be skipped."""
-        repo = {"archived": False, "fork": True}
-        should_skip = repo.get("archived") or repo.get("fork")
-        assert should_skip is True
-
-    def test_should_not_skip_normal_repos(self):
-        """Normal repos should not be skipped."""
-        repo = {"archived": False, "fork": False}
-        should_skip = repo.get("archived") or repo.get("fork")
-        assert should_skip is False
-
-
-# Integration test placeholder - requires real token
-class TestIntegration:
-    """Integration tests (require GITHUB_TOKEN env var)."""
-
-    @pytest.mark.skipif(
-        not os.environ.get("GITHUB_TOKEN"),
-        reason="GITHUB_TOKEN not set"
-    )
-    def test_can_authenticate(self):
-        """Should authenticate with real token."""
-        token = os.environ.get("GITHUB_TOKEN")
-        auditor = GitHubRulesetAuditor(token)
-        user = auditor.get_authenticated_user()
-        assert "login" in user
-        assert "id" in user
+    @pytest.mark.parametrize("archived, fork, expected", [
+        pytest.param(True, False, True, id="archived"),
+        pytest.param(False, True, True, id="forked"),
+        pytest.param(False, False, False, id="normal"),
+    ])
+    def test_should_skip(self, archived, fork, expected):
+        """Archived and forked repos should be skipped; normal repos kept."""
+        assert should_skip({"archived": archived, "fork": fork}) is expected